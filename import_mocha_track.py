@@ -31,8 +31,18 @@ To install:
 #           Imports             #
 # ----------------------------- #
 
-import os, shutil
-import flame
+import os, re, shutil
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+# flame is only importable inside Flame's own interpreter,
+# so the script can still be loaded outside it, ex. for linting
+
+try:
+    import flame
+except ImportError:
+    flame = None
 
 #         Main Script           #
 # ----------------------------- #
@@ -41,6 +51,250 @@ SCRIPT_NAME = 'Import Mocha Track'
 SCRIPT_PATH = '/opt/Autodesk/shared/python/import_mocha_track'
 VERSION = 'v0.1.2'
 
+# Setup text is handled as bytes from read to write, so nothing is re-encoded line by line
+
+# Setup text for a single key frame, filled in by key_frames() with % (index, frame, value, curve_order)
+# the locked template adds a ValueLock line, tracker key frames sit two tabs shallower
+
+KEY_FRAME_TEMPLATE = (
+    b'\t\t\tKey %d\n'
+    b'\t\t\t\tFrame %d\n'
+    b'\t\t\t\tValue %r\n'
+    b'\t\t\t\tRHandle_dX 0.25\n'
+    b'\t\t\t\tRHandle_dY 0\n'
+    b'\t\t\t\tLHandle_dX -0.25\n'
+    b'\t\t\t\tLHandle_dY 0\n'
+    b'\t\t\t\tCurveMode hermite\n'
+    b'\t\t\t\tCurveOrder %s\n'
+    b'\t\t\t\tEnd\n'
+)
+
+KEY_FRAME_LOCKED_TEMPLATE = (
+    b'\t\t\tKey %d\n'
+    b'\t\t\t\tFrame %d\n'
+    b'\t\t\t\tValue %r\n'
+    b'\t\t\t\tRHandle_dX 0.25\n'
+    b'\t\t\t\tRHandle_dY 0\n'
+    b'\t\t\t\tLHandle_dX -0.25\n'
+    b'\t\t\t\tLHandle_dY 0\n'
+    b'\t\t\t\tValueLock yes\n'
+    b'\t\t\t\tCurveMode hermite\n'
+    b'\t\t\t\tCurveOrder %s\n'
+    b'\t\t\t\tEnd\n'
+)
+
+TRACKER_KEY_FRAME_TEMPLATE = (
+    b'\tKey %d\n'
+    b'\t\tFrame %d\n'
+    b'\t\tValue %r\n'
+    b'\t\tRHandle_dX 0.25\n'
+    b'\t\tRHandle_dY 0\n'
+    b'\t\tLHandle_dX -0.25\n'
+    b'\t\tLHandle_dY 0\n'
+    b'\t\tCurveMode hermite\n'
+    b'\t\tCurveOrder %s\n'
+    b'\t\tEnd\n'
+)
+
+# Setup text for a tracker attachment (stabilizer setup), filled in by add_tracker() with a % mapping of its fields
+
+TRACKER_TEMPLATE = (
+    b'\tAttachement Tracker\n'
+    b'\tAttachementName \t"%(tracker)s"\n'
+    b'\tActive yes\n'
+    b'\tFixedRef no\n'
+    b'\tFixedX no\n'
+    b'\tFixedY no\n'
+    b'\tTolerance 100\n'
+    b'\tColour\n'
+    b'\t\tRed 100\n'
+    b'\t\tGreen 0\n'
+    b'\t\tBlue 0\n'
+    b'\tOffsetsX 0\n'
+    b'\tOffsetsY 0\n'
+    b'\tFirstRefFrame %(ref_frame)d\n'
+    b'\tAnim\n'
+    b'Channel ref/x\n'
+    b'\tExtrapolation constant\n'
+    b'\tValue %(ref_x)r\n'
+    b'\tSize 1\n'
+    b'\tKeyVersion 2\n'
+    b'%(ref_x_key)s'
+    b'\tColour 85 85 85\n'
+    b'\tEnd\n'
+    b'Channel ref/y\n'
+    b'\tExtrapolation constant\n'
+    b'\tValue %(ref_y)r\n'
+    b'\tSize 1\n'
+    b'\tKeyVersion 2\n'
+    b'%(ref_y_key)s'
+    b'\tColour 85 85 85\n'
+    b'\tEnd\n'
+    b'Channel ref/width\n'
+    b'\tExtrapolation constant\n'
+    b'\tValue 64\n'
+    b'\tColour 85 85 85\n'
+    b'\tEnd\n'
+    b'Channel ref/height\n'
+    b'\tExtrapolation constant\n'
+    b'\tValue 64\n'
+    b'\tColour 85 85 85\n'
+    b'\tEnd\n'
+    b'Channel ref/dx\n'
+    b'\tExtrapolation constant\n'
+    b'\tValue 0\n'
+    b'\tSize 1\n'
+    b'\tKeyVersion 2\n'
+    b'%(ref_zero_key)s'
+    b'\tColour 85 85 85\n'
+    b'\tEnd\n'
+    b'Channel ref/dy\n'
+    b'\tExtrapolation constant\n'
+    b'\tValue 0\n'
+    b'\tSize 1\n'
+    b'\tKeyVersion 2\n'
+    b'%(ref_zero_key)s'
+    b'\tColour 85 85 85\n'
+    b'\tEnd\n'
+    b'Channel track/x\n'
+    b'\tExtrapolation linear\n'
+    b'\tValue %(track_x)d\n'
+    b'\tColour 85 85 85\n'
+    b'\tEnd\n'
+    b'Channel track/y\n'
+    b'\tExtrapolation linear\n'
+    b'\tValue %(track_y)d\n'
+    b'\tColour 85 85 85\n'
+    b'\tEnd\n'
+    b'Channel track/width\n'
+    b'\tExtrapolation constant\n'
+    b'\tValue 96\n'
+    b'\tColour 85 85 85\n'
+    b'\tEnd\n'
+    b'Channel track/height\n'
+    b'\tExtrapolation constant\n'
+    b'\tValue 96\n'
+    b'\tColour 85 85 85\n'
+    b'\tEnd\n'
+    b'Channel shift/x\n'
+    b'\tExtrapolation linear\n'
+    b'\tValue 0\n'
+    b'\tSize %(size)d\n'
+    b'\tKeyVersion 2\n'
+    b'%(shift_x_keys)s'
+    b'\tColour 255 0 0\n'
+    b'\tEnd\n'
+    b'Channel shift/y\n'
+    b'\tExtrapolation linear\n'
+    b'\tValue 0\n'
+    b'\tSize %(size)d\n'
+    b'\tKeyVersion 2\n'
+    b'%(shift_y_keys)s'
+    b'\tColour 255 0 0\n'
+    b'\tEnd\n'
+    b'Channel offset/x\n'
+    b'\tExtrapolation linear\n'
+    b'\tValue 0\n'
+    b'\tColour 85 85 85\n'
+    b'\tEnd\n'
+    b'Channel offset/y\n'
+    b'\tExtrapolation linear\n'
+    b'\tValue 0\n'
+    b'\tColour 85 85 85\n'
+    b'\tEnd\n'
+    b'ChannelEnd\n'
+    b'AttachementEnd\n'
+)
+
+def channel_lines(corner):
+    # Creates a set of empty animation channels based on the corner name passed
+
+    if 'left' in corner :
+        horz_direction = 'right'
+    else :
+        horz_direction = 'left'
+
+    if 'lower' in corner :
+        vert_direction = 'up'
+    else :
+        vert_direction = 'down'
+
+    subchannel_names = ['position/x', 
+                        'position/y', 
+                        f'horz_tan_{horz_direction}/x', 
+                        f'horz_tan_{horz_direction}/y', 
+                        'horz_tan_cont', 
+                        f'vert_tan_{vert_direction}/x', 
+                        f'vert_tan_{vert_direction}/y', 
+                        'vert_tan_cont']
+    
+    ch_lines = []
+
+    for subchannel in subchannel_names :
+        if 'cont' in subchannel : val = 2 
+        else : val = 0
+
+        lines = [
+            f'\t\tChannel uv_track_vertices/{corner}/{subchannel}\n',
+            '\t\t\tExtrapolation constant\n',
+            f'\t\t\tValue {val}\n',
+            '\t\t\tEnd\n']
+
+        for ln in lines: 
+            ch_lines.append(ln.encode())
+
+    return ch_lines
+
+# Empty uv_track_vertices channels for each surface corner
+# there are only ever these four corners, so the channels are built once when the script loads
+
+EMPTY_CHANNELS = {corner: channel_lines(corner) for corner in ('lower_left', 'upper_left', 'lower_right', 'upper_right')}
+
+class EditBuffer():
+    # Collects line replacements and insertions against a setup list, then applies them all at once
+    # a single rebuild of the list instead of a list.insert() per line, which shifts the whole tail each time
+    # all positions refer to line indexes in the setup list as it was read
+
+    def __init__(self):
+        self.inserts = {}
+        self.replacements = {}
+
+    def insert_at(self, pos, lines):
+        # Queues lines to be inserted before line pos
+        # lines queued at the same pos keep the order they were queued in
+
+        self.inserts.setdefault(pos, []).extend(lines)
+
+    def replace(self, pos, line):
+        # Queues line pos to be swapped for a new line
+
+        self.replacements[pos] = line
+
+    def shifted(self, pos):
+        # Returns the index line pos will have once the queued inserts are applied
+
+        return pos + sum(len(lines) for insert_pos, lines in self.inserts.items() if insert_pos <= pos)
+
+    def apply(self, setup):
+        # Returns a new setup list with every queued edit spliced in
+
+        edited = []
+        last = 0
+
+        for pos in sorted(self.inserts.keys() | self.replacements.keys()) :
+            edited.extend(setup[last:pos])
+            edited.extend(self.inserts.get(pos, ()))
+
+            if pos in self.replacements :
+                edited.append(self.replacements[pos])
+                last = pos + 1
+            else :
+                last = pos
+
+        edited.extend(setup[last:])
+
+        return edited
+
 class MochaTrack():
     def __init__(self):
         # Get host node
@@ -97,24 +351,35 @@ class MochaTrack():
 
         # Load each line of setup file into list 'contents'
 
-        with open(self.node_filename, 'r') as edit_node:
+        with open(self.node_filename, 'rb') as edit_node:
             contents = edit_node.readlines()
 
+        # Index every line we need to look up in a single pass over the setup
+        # all edits are queued against these original line numbers and applied at the end
+
+        index = self.index_lines(['FrameWidth', 'FrameHeight', f'Name {node_name}', 'TransformIs3D'], contents)
+
+        edits = EditBuffer()
+
         # Fetch resolution from the setup file
 
-        width_line = self.find_line('FrameWidth', contents)
+        width_line = self.find_line('FrameWidth', index)
         width = int(contents[width_line].split()[1])
         
-        height_line = self.find_line_after('FrameHeight', width_line, contents)
+        height_line = self.find_line_after('FrameHeight', width_line, index)
         height = int(contents[height_line].split()[1])
 
         # Change perspective grid type to 2D
         # this is necessary for stabilize --> destabilize workflows 
         # change back to 3D in the GUI if undesired
 
-        grid_line = self.find_line(node_name, contents)
-        grid_3d_line = self.find_line_after('TransformIs3D', grid_line, contents)
-        contents[grid_3d_line] = '\t\tTransformIs3D no\n'
+        grid_line = self.find_line(f'Name {node_name}', index)
+        grid_3d_line = self.find_line_after('TransformIs3D', grid_line, index)
+        edits.replace(grid_3d_line, b'\t\tTransformIs3D no\n')
+
+        # Map the grid's channels to their header lines, so each corner channel is found by name
+
+        channels = self.index_channels(grid_line, contents)
 
         # Translate mocha corners' x,y coordinates to their flame equivalent
         # Offsetting mocha's position indexes (0,0 = lower left corner) 
@@ -123,26 +388,23 @@ class MochaTrack():
         h_offset = width // 2
         v_offset = height // 2
 
-        for key in self.corners :
-            translation = []
+        for key, corner in self.corners.items() :
+            x = [(f, xo - h_offset + 0.5) for f, xo, yo in corner]
+            y = [(f, yo - v_offset + 0.5) for f, xo, yo in corner]
 
-            for i in self.corners[key] :
-                f, xo, yo = i
-                tf = (f, float(xo - h_offset + 0.5), float(yo - v_offset + 0.5))
-                translation.append(tf)
+            # Add animation from current corner to setup list
+            x_line = channels[f'{key}_corner/x']
+            y_line = channels[f'{key}_corner/y']
 
-            x = self.extract_dimension(translation, 'x')
-            y = self.extract_dimension(translation, 'y')
+            self.add_animation(edits, x_line, x)
+            self.add_animation(edits, y_line, y)
 
-            # Add animation from current corner to setup list
-            contents = self.add_animation(node_name, contents, f'{key}_corner/x', x)
-            contents = self.add_animation(node_name, contents, f'{key}_corner/y', y)
+        contents = edits.apply(contents)
 
         # Write the modified setup list back to setup file
 
-        with open(self.node_filename, 'w') as edit_node :
-            for l in contents :
-                edit_node.write(l)
+        with open(self.node_filename, 'wb') as edit_node :
+            edit_node.writelines(contents)
 
         # Reload saved node
 
@@ -177,152 +439,132 @@ class MochaTrack():
 
         # Load each line of setup file into list 'contents'
 
-        with open(self.node_filename, 'r') as edit_node:
+        with open(self.node_filename, 'rb') as edit_node:
             contents = edit_node.readlines()
 
+        # Index every line we need to look up in a single pass over the setup
+        # edits are queued against these original line numbers and applied together
+
+        index = self.index_lines([f'Name {node_name}', 'ResWidth', 'ResHeight', 'IsSoftImported', 'NumUVTrackControlPoints'], contents)
+
+        edits = EditBuffer()
+
         # Change surface type to Bilinear
         # can be changed to perspective or extended bicubic after import in GUI
 
-        name_line = self.find_line(node_name, contents)
-        contents[name_line - 1] = 'Node SurfaceBilinear\n'
+        name_line = self.find_line(f'Name {node_name}', index)
+        edits.replace(name_line - 1, b'Node SurfaceBilinear\n')
+
+        # Map the surface's channels to their header lines, so each one is found by name
+
+        channels = self.index_channels(name_line, contents)
 
         # Fetch resolution from the setup file
 
-        width_line = self.find_line_after('ResWidth', name_line, contents)
+        width_line = self.find_line_after('ResWidth', name_line, index)
         width = int(contents[width_line].split()[1])
         
-        height_line = self.find_line_after('ResHeight', width_line, contents)
+        height_line = self.find_line_after('ResHeight', width_line, index)
         height = int(contents[height_line].split()[1])
 
         # add tracker attachments for each corner
         #      --these are essentially inserting the Stabilizer setups for each corner
+        #      --each attachment is queued as soon as it's built, lines queued at the same index keep their order
         
-        input_line = self.find_line_after('IsSoftImported', name_line, contents) + 1
-
-        tracker_ll = self.add_tracker('offset0_0', self.lower_left, width, height)
-        tracker_ul = self.add_tracker('offset0_1', self.upper_left, width, height)
-        tracker_lr = self.add_tracker('offset1_0', self.lower_right, width, height)
-        tracker_ur = self.add_tracker('offset1_1', self.upper_right, width, height)
+        input_line = self.find_line_after('IsSoftImported', name_line, index) + 1
 
-        tracker_attachments = [*tracker_ll, *tracker_ul, *tracker_lr, *tracker_ur]
-
-        for line_num, line_val in enumerate(tracker_attachments, input_line) :
-            contents.insert(line_num, line_val)
+        trackers = [
+            (b'offset0_0', self.lower_left),
+            (b'offset0_1', self.upper_left),
+            (b'offset1_0', self.lower_right),
+            (b'offset1_1', self.upper_right)
+        ]
 
-        track_points_line = self.find_line_after('NumUVTrackControlPoints', input_line, contents)
-        contents[track_points_line] = '\t\tNumUVTrackControlPoints 4\n'
+        for tracker, corner in trackers :
+            edits.insert_at(input_line, [self.add_tracker(tracker, corner, width, height)])
 
-        for n in range(4) :
-            uvt_line = track_points_line + 1 + n
-            contents.insert(uvt_line, f'\t\tUVTrackControlPoint {n}\n')
+        track_points_line = self.find_line_after('NumUVTrackControlPoints', name_line, index)
+        edits.replace(track_points_line, b'\t\tNumUVTrackControlPoints 4\n')
+        edits.insert_at(track_points_line + 1, [b'\t\tUVTrackControlPoint %d\n' % n for n in range(4)])
 
         # Add ainmation for the uv shape channel. 
         #      value of each frame is an integer index, much like a gmask shape channel
 
-        shapes = [(frame_tup[0], index) for index, frame_tup in enumerate(self.lower_left)]
-        contents = self.add_animation(node_name, contents, 'uv_track_shape', shapes, value_lock=True, extrapolation='constant', curve_order='linear')
-        
+        shapes = [(frame_tup[0], shape_index) for shape_index, frame_tup in enumerate(self.lower_left)]
+        shape_line = channels['uv_track_shape']
+        self.add_animation(edits, shape_line, shapes, value_lock=True, extrapolation=b'constant', curve_order=b'linear')
+
         # Remove the empty 'uv_track_vertices' channel
         # We will replace with individual channels for each corner's x and y position
+        #      --its index is shifted past the queued inserts rather than searched for again
 
-        track_vertices_line = self.find_line_after('uv_track_vertices', uvt_line, contents)
+        track_vertices_line = edits.shifted(channels['uv_track_vertices'])
 
-        while 'End' not in contents[track_vertices_line] :
-            contents.pop(track_vertices_line)
-        contents.pop(track_vertices_line)
+        contents = edits.apply(contents)
 
-        def channel_lines(corner):
-            # Creates a set of empty animation channels based on the corner name passed
+        vertices_end_line = track_vertices_line
 
-            if 'left' in corner :
-                horz_direction = 'right'
-            else :
-                horz_direction = 'left'
+        while b'End' not in contents[vertices_end_line] :
+            vertices_end_line += 1
 
-            if 'lower' in corner :
-                vert_direction = 'up'
-            else :
-                vert_direction = 'down'
-
-            subchannel_names = ['position/x', 
-                                'position/y', 
-                                f'horz_tan_{horz_direction}/x', 
-                                f'horz_tan_{horz_direction}/y', 
-                                'horz_tan_cont', 
-                                f'vert_tan_{vert_direction}/x', 
-                                f'vert_tan_{vert_direction}/y', 
-                                'vert_tan_cont']
-            
-            ch_lines = []
+        # Add the prebuilt channels from EMPTY_CHANNELS to our setup list
+        # keeping a running offset into the block, so we know each corner's position channels' lines without a search
+        #      --channel_lines() starts with position/x then position/y, four lines each
 
-            for subchannel in subchannel_names :
-                if 'cont' in subchannel : val = 2 
-                else : val = 0
+        empty_channels = []
+        position_lines = {}
 
-                lines = [
-                    f'\t\tChannel uv_track_vertices/{corner}/{subchannel}\n',
-                    '\t\t\tExtrapolation constant\n',
-                    f'\t\t\tValue {val}\n',
-                    '\t\t\tEnd\n']
+        for key in ('lower_left', 'upper_left', 'lower_right', 'upper_right') :
+            corner_line = track_vertices_line + len(empty_channels)
 
-                for ln in lines: 
-                    ch_lines.append(ln)
+            position_lines[f'{key}/position/x'] = corner_line
+            position_lines[f'{key}/position/y'] = corner_line + 4
 
-            return ch_lines
+            empty_channels.extend(EMPTY_CHANNELS[key])
 
-        # Create all needed channels with channel_lines() and add them to our setup list
+        # swap the whole empty channel, up to and including its End line, for the new channels in one splice
 
-        empty_channels = [*channel_lines('lower_left'), *channel_lines('upper_left'), *channel_lines('lower_right'), *channel_lines('upper_right')]
+        contents[track_vertices_line:vertices_end_line + 1] = empty_channels
 
-        for setup_line_num, empty_channel_line in enumerate(empty_channels, track_vertices_line) :
-            contents.insert(setup_line_num, empty_channel_line)
+        edits = EditBuffer()
 
         # Offset corner animation values based on flame's expected indexes
-        # the channel names in original_path_channels all index the same way as Mocha, with 0,0 in the lower left
+        # lower_left x & y, upper_left x and lower_right y all index the same way as Mocha, with 0,0 in the lower left
         # the remaining channels index in reverse, ie. for x channels flameX = mochaX - width, for y channels flameY = mochaY - height 
-        
-        original_path_channels = ['lower_left/position/x', 'lower_left/position/y', 'upper_left/position/x', 'lower_right/position/y']
-
-        for key in self.corners.keys() :
-
-            x = self.extract_dimension(self.corners[key], 'x')
-            y = self.extract_dimension(self.corners[key], 'y')
-
-            channel_names = [f'{key}/position/x', f'{key}/position/y']
-
-            x_translation = []
-            y_translation = []
-
-            for ch_dimension in channel_names :
-                if ch_dimension in original_path_channels : 
-                    if ch_dimension.endswith('x') :
-                        for kf in x :
-                            tf = (kf[0], kf[1] + 0.5)
-                            x_translation.append(tf)
-                    else :
-                        for kf in y :
-                            tf = (kf[0], kf[1] + 0.5)
-                            y_translation.append(tf)
-
-                else :
-                    if ch_dimension.endswith('x') :
-                        for kf in x :
-                            tf = (kf[0], kf[1] - width - 0.5)
-                            x_translation.append(tf)
-                    else :
-                        for kf in y :
-                            tf = (kf[0], kf[1] - height - 0.5)
-                            y_translation.append(tf)
+        #
+        # channel --> (origin, half pixel), each keyframe value becomes mocha value - origin + half pixel
+
+        channel_offsets = {
+            'lower_left/position/x': (0, 0.5),
+            'lower_left/position/y': (0, 0.5),
+            'upper_left/position/x': (0, 0.5),
+            'upper_left/position/y': (height, -0.5),
+            'lower_right/position/x': (width, -0.5),
+            'lower_right/position/y': (0, 0.5),
+            'upper_right/position/x': (width, -0.5),
+            'upper_right/position/y': (height, -0.5)
+        }
+
+        for key, corner in self.corners.items() :
+            x_origin, x_half_pixel = channel_offsets[f'{key}/position/x']
+            y_origin, y_half_pixel = channel_offsets[f'{key}/position/y']
+
+            x_translation = [(f, xo - x_origin + x_half_pixel) for f, xo, yo in corner]
+            y_translation = [(f, yo - y_origin + y_half_pixel) for f, xo, yo in corner]
 
             # Add animation from current corner to setup list
-            contents = self.add_animation(node_name, contents, f'uv_track_vertices/{key}/position/x', x_translation, extrapolation='constant', curve_order='linear', value_index=-1)
-            contents = self.add_animation(node_name, contents, f'uv_track_vertices/{key}/position/y', y_translation, extrapolation='constant', curve_order='linear', value_index=-1)      
+            x_line = position_lines[f'{key}/position/x']
+            y_line = position_lines[f'{key}/position/y']
+
+            self.add_animation(edits, x_line, x_translation, extrapolation=b'constant', curve_order=b'linear', value_index=-1)
+            self.add_animation(edits, y_line, y_translation, extrapolation=b'constant', curve_order=b'linear', value_index=-1)
+
+        contents = edits.apply(contents)
 
         # Write the modified setup list back to setup file
 
-        with open(self.node_filename, 'w') as edit_node :
-            for l in contents :
-                edit_node.write(l)
+        with open(self.node_filename, 'wb') as edit_node :
+            edit_node.writelines(contents)
 
         # Reload saved node
 
@@ -334,218 +576,65 @@ class MochaTrack():
 
         flame.messages.show_in_console(f"Surface UVs Loaded '{self.track_name}' loaded", duration = 5)
 
-    def key_frame(self, index, frame, value, value_lock=False, curve_order='linear') :
-        # Creates a list of all setup lines to write out for a key frame based on supplied values
-
-        kf_lines = [
-            f'\t\t\tKey {index}\n',
-            f'\t\t\t\tFrame {frame}\n',
-            f'\t\t\t\tValue {value}\n',
-            '\t\t\t\tRHandle_dX 0.25\n',
-            '\t\t\t\tRHandle_dY 0\n',
-            '\t\t\t\tLHandle_dX -0.25\n',
-            '\t\t\t\tLHandle_dY 0\n',
-            '\t\t\t\tCurveMode hermite\n',
-            f'\t\t\t\tCurveOrder {curve_order}\n',
-            '\t\t\t\tEnd\n'
-        ]
-
-        if value_lock : kf_lines.insert(7, '\t\t\t\tValueLock yes\n')
+    def key_frames(self, template, animation, curve_order=b'linear') :
+        # Creates one block of setup text for a whole run of key frames
+        # template: one of the KEY_FRAME templates, sets indentation and value lock
+        # animation: keyframe tuples [(frame, value)...], keys are numbered from 0
 
-        return kf_lines
+        return b''.join([template % (index, frame, value, curve_order) for index, (frame, value) in enumerate(animation)])
     
-    def extract_dimension(self, corner, dimension):
-        # Pulls out just x or y animation from a full corner list
-
-        if dimension == 'x' :
-            return [(p[0], p[1]) for p in corner]
-        elif dimension == 'y' :
-            return [(p[0], p[2]) for p in corner]
-
     def add_tracker(self, tracker, corner, width, height) :
-        #Creates all lines for a tracker attachment (stabilizer setup)
-
-        ref_frame = corner[0][0]
-
-        attachment_lines = [
-            '\tAttachement Tracker\n',
-            f'\tAttachementName \t"{tracker}"\n',
-            '\tActive yes\n',
-            '\tFixedRef no\n',
-            '\tFixedX no\n',
-            '\tFixedY no\n',
-            '\tTolerance 100\n',
-            '\tColour\n',
-            '\t\tRed 100\n',
-            '\t\tGreen 0\n',
-            '\t\tBlue 0\n',
-            '\tOffsetsX 0\n',
-            '\tOffsetsY 0\n',
-            f'\tFirstRefFrame {ref_frame}\n',
-            '\tAnim\n',
-            'Channel ref/x\n',
-            '\tExtrapolation constant\n',
-            f'\tValue {corner[0][1]}\n',
-            '\tSize 1\n',
-            '\tKeyVersion 2\n'
-        ]
-
-        attachment_lines.extend([k[2:] for k in self.key_frame(0, ref_frame, corner[0][1])])
-
-        # Creates x and y reference key frames on the start frame
-
-        ref_y_lines = [
-            '\tColour 85 85 85\n',
-            '\tEnd\n',
-            'Channel ref/y\n',
-            '\tExtrapolation constant\n',
-            f'\tValue {corner[0][2]}\n',
-            '\tSize 1\n',
-            '\tKeyVersion 2\n'
-        ]
-
-        attachment_lines.extend(ref_y_lines)
-        attachment_lines.extend([k[2:] for k in self.key_frame(0, ref_frame, corner[0][2])])
-
-        ref_lines = [
-            '\tColour 85 85 85\n',
-            '\tEnd\n',
-            'Channel ref/width\n',
-            '\tExtrapolation constant\n',
-            '\tValue 64\n',
-            '\tColour 85 85 85\n',
-            '\tEnd\n',
-            'Channel ref/height\n',
-            '\tExtrapolation constant\n',
-            '\tValue 64\n',
-            '\tColour 85 85 85\n',
-            '\tEnd\n',
-            'Channel ref/dx\n',
-            '\tExtrapolation constant\n',
-            '\tValue 0\n',
-            '\tSize 1\n',
-            '\tKeyVersion 2\n'
-        ]
-
-        attachment_lines.extend(ref_lines)
-        attachment_lines.extend([k[2:] for k in self.key_frame(0, ref_frame, 0)])
-        
-        ref_dy_lines = [
-            '\tColour 85 85 85\n',
-            '\tEnd\n',
-            'Channel ref/dy\n',
-            '\tExtrapolation constant\n',
-            '\tValue 0\n',
-            '\tSize 1\n',
-            '\tKeyVersion 2\n'
-        ]
-
-        attachment_lines.extend(ref_dy_lines)
-        attachment_lines.extend([k[2:] for k in self.key_frame(0, ref_frame, 0)])
-
-        # Adds animation for shift channels as an offset from reference frame
-
-        shift_x_lines = [
-            '\tColour 85 85 85\n',
-            '\tEnd\n',
-            'Channel track/x\n',
-            '\tExtrapolation linear\n',
-            f'\tValue {width // 2}\n',
-            '\tColour 85 85 85\n',
-            '\tEnd\n',
-            'Channel track/y\n',
-            '\tExtrapolation linear\n',
-            f'\tValue {height // 2}\n',
-            '\tColour 85 85 85\n',
-            '\tEnd\n',
-            'Channel track/width\n',
-            '\tExtrapolation constant\n',
-            '\tValue 96\n',
-            '\tColour 85 85 85\n',
-            '\tEnd\n',
-            'Channel track/height\n',
-            '\tExtrapolation constant\n',
-            '\tValue 96\n',
-            '\tColour 85 85 85\n',
-            '\tEnd\n',
-            'Channel shift/x\n',
-            '\tExtrapolation linear\n',
-            '\tValue 0\n',
-            f'\tSize {len(corner)}\n',
-            '\tKeyVersion 2\n'
-        ]
-
-        attachment_lines.extend(shift_x_lines)
-
-        for i, f in enumerate(corner) :         
-            attachment_lines.extend([k[2:] for k in self.key_frame(i, f[0], corner[0][1] - f[1], curve_order='linear')])
-
-        shift_y_lines = [
-            '\tColour 255 0 0\n',
-            '\tEnd\n',
-            'Channel shift/y\n',
-            '\tExtrapolation linear\n',
-            '\tValue 0\n',
-            f'\tSize {len(corner)}\n',
-            '\tKeyVersion 2\n',
-        ]
-
-        attachment_lines.extend(shift_y_lines)
-
-        for i, f in enumerate(corner) :
-
-            attachment_lines.extend([k[2:] for k in self.key_frame(i, f[0], corner[0][2] - f[2], curve_order='linear')])
-
-        attachment_end = [
-            '\tColour 255 0 0\n',
-            '\tEnd\n',
-            'Channel offset/x\n',
-            '\tExtrapolation linear\n',
-            '\tValue 0\n',
-            '\tColour 85 85 85\n',
-            '\tEnd\n',
-            'Channel offset/y\n',
-            '\tExtrapolation linear\n',
-            '\tValue 0\n',
-            '\tColour 85 85 85\n',
-            '\tEnd\n',
-            'ChannelEnd\n',
-            'AttachementEnd\n'
-        ]
-        attachment_lines.extend(attachment_end)
-
-        return attachment_lines
+        # Creates the block of setup text for a tracker attachment (stabilizer setup)
+
+        ref_frame, ref_x, ref_y = corner[0]
+
+        # reference key frames sit on the start frame,
+        # shift channels animate each frame as an offset from the reference frame
+        #      --offsets are worked out over whole columns first, so the key frame loops only format text
+
+        frames, xs, ys = zip(*corner)
+
+        shift_x = [ref_x - x for x in xs]
+        shift_y = [ref_y - y for y in ys]
+
+        shift_x_keys = self.key_frames(TRACKER_KEY_FRAME_TEMPLATE, zip(frames, shift_x))
+        shift_y_keys = self.key_frames(TRACKER_KEY_FRAME_TEMPLATE, zip(frames, shift_y))
+
+        return TRACKER_TEMPLATE % {
+            b'tracker': tracker,
+            b'ref_frame': ref_frame,
+            b'ref_x': ref_x,
+            b'ref_y': ref_y,
+            b'ref_x_key': self.key_frames(TRACKER_KEY_FRAME_TEMPLATE, [(ref_frame, ref_x)]),
+            b'ref_y_key': self.key_frames(TRACKER_KEY_FRAME_TEMPLATE, [(ref_frame, ref_y)]),
+            b'ref_zero_key': self.key_frames(TRACKER_KEY_FRAME_TEMPLATE, [(ref_frame, 0)]),
+            b'track_x': width // 2,
+            b'track_y': height // 2,
+            b'size': len(corner),
+            b'shift_x_keys': shift_x_keys,
+            b'shift_y_keys': shift_y_keys
+        }
         
-    def add_animation(self, node_name, setup, channel, animation, value_lock=False, extrapolation='linear', curve_order='linear', value_index=0) :
-        # Adds an animation curve to the passed channel in the setup list
-        # node_name: name of the action/gmask tracer node to animate
-        # setup: list of setup file contents by line
-        # channel: string of the channel to animate ex. 'upper_left/position/x' etc
+    def add_animation(self, edits, channel_line, animation, value_lock=False, extrapolation=b'linear', curve_order=b'linear', value_index=0) :
+        # Queues an animation curve for the channel starting at channel_line
+        # edits: EditBuffer of pending changes to the setup list
+        # channel_line: index of the channel's header line ex. 'Channel upper_left/position/x' in the setup list
         # animation: list of keyframe tuples [(frame, value)...]
-        #
-        # returns full modified setup list
-
-        node_line = self.find_line(node_name, setup)
-        channel_line = self.find_line_after(channel, node_line, setup)
 
-        setup[channel_line + 1] = f'\t\t\tExtrapolation {extrapolation}\n'
-        setup[channel_line + 2] = f'\t\t\tValue {animation[value_index][1]}\n'
+        edits.replace(channel_line + 1, b'\t\t\tExtrapolation %s\n' % extrapolation)
+        edits.replace(channel_line + 2, b'\t\t\tValue %r\n' % animation[value_index][1])
 
         animation_lines = [
-            f'\t\t\tSize {len(animation)}\n',
-            '\t\t\tKeyVersion 2\n']
+            b'\t\t\tSize %d\n' % len(animation),
+            b'\t\t\tKeyVersion 2\n']
 
-        for anim_index, frame_value in enumerate(animation) :
-            animation_lines.extend(self.key_frame(anim_index, frame_value[0], frame_value[1], value_lock, curve_order))
+        template = KEY_FRAME_LOCKED_TEMPLATE if value_lock else KEY_FRAME_TEMPLATE
 
-        for anim_line_index, animated_line_value in enumerate(animation_lines, channel_line + 3) :
-            setup.insert(anim_line_index, animated_line_value)
+        animation_lines.append(self.key_frames(template, animation, curve_order))
 
-        return setup
+        edits.insert_at(channel_line + 3, animation_lines)
     
     def parse_mocha_files(self) :
-        import re
-
         #creates browser to select .ascii mocha track files
         flame.browser.show(default_path='/data', 
                            extension='ascii', 
@@ -602,35 +691,24 @@ class MochaTrack():
                     self.track_name = mocha_names[0]
 
         # finally, add our corners to our instance's attributes
-        
-        def frame_to_tuple(file_line):
-            #converts a line of mocha track data into a tuple: (frame num, x, y)
-
-            stripped = ''.join(file_line.split())
-            no_colon = stripped.replace(':', ',')
-            line_info_slice = no_colon.split(',')
-
-            frame_float = float(line_info_slice[0])
-            frame_int = int(frame_float)
+        # the four files are independent, so they're read concurrently
+    
+        # mocha tracker number --> the corner it holds
 
-            frame_info = (frame_int + self.sf_offset, float(line_info_slice[1]), float(line_info_slice[2]))
+        tracker_corners = {
+            '_Tracker1': self.upper_left,
+            '_Tracker2': self.upper_right,
+            '_Tracker3': self.lower_left,
+            '_Tracker4': self.lower_right
+        }
 
-            return frame_info
-    
-        for l in selected_files :
+        with ThreadPoolExecutor(max_workers=4) as executor :
+            tracks = executor.map(read_mocha_file, selected_files, [self.sf_offset] * 4)
 
-            with open(l, 'r') as f :
-                for line in f :
-                    track_frame = frame_to_tuple(line)
+            for file, track in zip(tracker_file_names, tracks) :
+                # pick the corner once per file rather than testing the filename on every line
 
-                    if l[0:-6].endswith('Tracker1') :
-                        self.upper_left.append(track_frame)
-                    elif l[0:-6].endswith('Tracker2') :
-                        self.upper_right.append(track_frame)
-                    elif l[0:-6].endswith('Tracker3') :
-                        self.lower_left.append(track_frame)
-                    elif l[0:-6].endswith('Tracker4') :
-                        self.lower_right.append(track_frame)
+                tracker_corners[tracker_regex.search(file).group()].extend(track)
 
         self.corners = {
             'lower_left': self.lower_left,
@@ -639,48 +717,84 @@ class MochaTrack():
             'upper_right': self.upper_right
         }
     
-    def find_line(self, item, setup):
-        # Fetches the index of a passed string in a setup list
-        # slightly modified version of a method of the same name from Michael Vaglienty's Invert Axis script. 
+    def index_lines(self, items, setup):
+        # Maps each passed string to the sorted indexes of every setup line that starts with it
+        # built in one pass so lookups don't each rescan the whole setup list
+        #
+        # items are matched as whole words at the start of a line, after its indentation,
+        # so 'Name track' won't match 'Name track1' or a line that only mentions the name
+
+        encoded_items = {item.encode(): item for item in items}
+
+        alternatives = b'|'.join(re.escape(item) for item in sorted(encoded_items, key=len, reverse=True))
+        item_regex = re.compile(rb'\s*(' + alternatives + rb')(?=\s|$)')
+
+        index = {item: [] for item in items}
 
         for num, line in enumerate(setup):
-            if item in line:
-                item_line = num
-                return item_line
+            item_match = item_regex.match(line)
+
+            if item_match :
+                index[encoded_items[item_match.group(1)]].append(num)
+
+        return index
+
+    def index_channels(self, node_line, setup):
+        # Maps each channel name in a node to the index of its 'Channel' header line in the setup list
+        # one forward pass from the node's name line to the start of the next node
+        # the first channel of a name wins, same as find_line_after()
+
+        channels = {}
+
+        for num, line in enumerate(islice(setup, node_line + 1, None), node_line + 1):
+            if line.startswith(b'Node ') :
+                break
+
+            stripped = line.lstrip()
+
+            if stripped.startswith(b'Channel ') :
+                channels.setdefault(stripped.split()[1].decode(), num)
+
+        return channels
+
+    def find_line(self, item, index):
+        # Fetches the index of a passed string from a setup index built by index_lines()
+        # slightly modified version of a method of the same name from Michael Vaglienty's Invert Axis script. 
+
+        return index[item][0]
         
-    def find_line_after(self, item, item_line_num, setup):
-        # Fetches the index of a string 'item' that appears after a passed index in setup list
+    def find_line_after(self, item, item_line_num, index):
+        # Fetches the index of a string 'item' that appears after a passed index in a setup index
         # slightly modified version of a method of the same name from Michael Vaglienty's Invert Axis script
 
-        for num, line in enumerate(setup):
-            if num > item_line_num:
-                if item in line:
-                    line_number = num
-                    return line_number
+        item_lines = index[item]
+
+        return item_lines[bisect_right(item_lines, item_line_num)]
 
-    def name_import(self, name, object_num=0):
+    def name_import(self, name):
         # Checks to see if any nodes already have the same name as our Mocha track
+        # and appends the first free number to it if so
         # based on the method name_axis() from Michael Vaglienty's Invert Axis script
 
-        existing_nodes = [node.name.get_value() for node in self.host_node.nodes]
+        existing_nodes = {node.name.get_value() for node in self.host_node.nodes}
 
         if name not in existing_nodes:
             return name
-        
-        object_num += 1
 
-        return self.name_import(f'{self.track_name}{object_num}', object_num)
+        object_num = 1
+
+        while f'{name}{object_num}' in existing_nodes:
+            object_num += 1
+
+        return f'{name}{object_num}'
     
     # Following methods were all lifted from Michael Vaglienty's Invert Axis script
 
     def save_selected_node(self):
         # Create temp save dir
+        # a leftover folder is reused as is, the node setup saved below overwrites any stale copy
 
-        try:
-            os.makedirs(self.temp_folder)
-        except:
-            shutil.rmtree(self.temp_folder)
-            os.makedirs(self.temp_folder)
+        os.makedirs(self.temp_folder, exist_ok=True)
 
         # Save selected node
 
@@ -696,6 +810,22 @@ class MochaTrack():
 
         shutil.rmtree(self.temp_folder)
 
+def read_mocha_file(path, sf_offset) :
+    # Reads a mocha track file into a list of tuples: (frame num, x, y)
+    # sf_offset shifts mocha's frame numbers onto the batch's start frame
+
+    def frame_to_tuple(file_line):
+        #converts a line of mocha track data into a tuple: (frame num, x, y)
+        #      --lines are always 'frame: x, y', so partition on the separators in one left to right pass
+
+        frame, _, point = file_line.partition(b':')
+        x, _, y = point.partition(b',')
+
+        return (int(float(frame)) + sf_offset, float(x), float(y))
+
+    with open(path, 'rb') as f :
+        return list(map(frame_to_tuple, f))
+
 def perspective_grid(self) :
     pg = MochaTrack()
 